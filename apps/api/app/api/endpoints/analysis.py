@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.db.base import get_db, SessionLocal
 from app.db.models import Session as UserSession, AnalysisResult
 from app.services.mock_analysis import run_mock_pipeline
+from app.services.replay_index import build_replay_index
 from app.clients.imentiv import ImentivClient 
 import os
 import boto3
@@ -101,6 +102,13 @@ def run_real_pipeline(session_id: int):
         db.commit()
         logger.info(f"✅ Analysis for Session {session_id} saved. Scores: {metrics['confidence']}, {metrics['engagement']}")
 
+        # 5. Build Replay Scrubbing Index (keyframe offsets + thumbnail sprite)
+        # Reuses the local copy; a failure here must not fail the analysis.
+        try:
+            build_replay_index(session_id, temp_file, real_timeline)
+        except Exception as e:
+            logger.warning(f"⚠️ Replay index for Session {session_id} skipped: {e}")
+
     except Exception as e:
         logger.error(f"❌ Analysis Pipeline Failed: {e}")
         db.rollback()
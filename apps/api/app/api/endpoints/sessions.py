@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.db.base import get_db
 from app.db.models import Session as SessionModel
+from app.services.replay_index import get_index_key, get_sprite_key
+from typing import Optional
 import boto3
 import io
+import json
 
 router = APIRouter()
 
@@ -23,20 +26,58 @@ def get_sessions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db))
     return sessions
 
 # 2. STREAM VIDEO (The "Proxy Player")
+# Honours Range headers so the player can seek to keyframe offsets from the replay index
 @router.get("/{session_id}/video")
-def stream_video(session_id: str):
+def stream_video(session_id: str, range: Optional[str] = Header(None)):
     try:
         file_key = f"{session_id}.webm"
+        headers = {
+            "Content-Disposition": f"inline; filename={file_key}",
+            "Accept-Ranges": "bytes"
+        }
         
-        # Get the file stream from MinIO
-        response = s3_internal.get_object(Bucket="videos", Key=file_key)
+        # Get the file stream (or just the requested byte range) from MinIO
+        if range:
+            response = s3_internal.get_object(Bucket="videos", Key=file_key, Range=range)
+            headers["Content-Range"] = response["ContentRange"]
+            headers["Content-Length"] = str(response["ContentLength"])
+            status_code = 206
+        else:
+            response = s3_internal.get_object(Bucket="videos", Key=file_key)
+            headers["Content-Length"] = str(response["ContentLength"])
+            status_code = 200
         
         # Stream it back to the browser
         return StreamingResponse(
             response['Body'], 
+            status_code=status_code,
             media_type="video/webm",
-            headers={"Content-Disposition": f"inline; filename={file_key}"}
+            headers=headers
         )
     except Exception as e:
         print(f"Video Stream Error: {e}")
-        raise HTTPException(status_code=404, detail="Video not found")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="Video not found")
+
+# 3. REPLAY INDEX (Keyframe offsets + timeline pre-joined to keyframes)
+@router.get("/{session_id}/replay-index")
+def get_replay_index(session_id: str):
+    try:
+        response = s3_internal.get_object(Bucket="videos", Key=get_index_key(session_id))
+        return json.loads(response['Body'].read())
+    except Exception as e:
+        print(f"Replay Index Error: {e}")
+        raise HTTPException(status_code=404, detail="Replay index not found")
+
+# 4. THUMBNAIL SPRITE (Hover previews, sliced using the layout in the replay index)
+@router.get("/{session_id}/thumbnails")
+def get_thumbnail_sprite(session_id: str):
+    try:
+        response = s3_internal.get_object(Bucket="videos", Key=get_sprite_key(session_id))
+        return StreamingResponse(
+            response['Body'],
+            media_type="image/jpeg",
+            headers={"Cache-Control": "public, max-age=86400"}
+        )
+    except Exception as e:
+        print(f"Thumbnail Sprite Error: {e}")
+        raise HTTPException(status_code=404, detail="Thumbnails not found")
\ No newline at end of file
@@ -0,0 +1,391 @@
+import bisect
+import json
+import logging
+import math
+import os
+import struct
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import boto3
+
+logger = logging.getLogger("ReplayIndex")
+
+s3_internal = boto3.client('s3',
+    endpoint_url="http://minio:9000",
+    aws_access_key_id="minioadmin",
+    aws_secret_access_key="minioadmin"
+)
+
+VIDEO_BUCKET = "videos"
+
+# Sprite sheet layout: one low-res frame every THUMBNAIL_INTERVAL seconds,
+# packed left-to-right, top-to-bottom into a single JPEG.
+THUMBNAIL_INTERVAL = 2.0
+THUMBNAIL_WIDTH = 160
+SPRITE_COLUMNS = 10
+
+# EBML / Matroska element IDs used by the scanner
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_TYPE = 0x83
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+CLUSTER_TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+REFERENCE_BLOCK = 0xFB
+
+# Direct children of Segment. An unknown-size Cluster (what MediaRecorder
+# writes) ends as soon as one of these shows up.
+SEGMENT_CHILDREN = {
+    0x114D9B74,  # SeekHead
+    INFO,
+    TRACKS,
+    CLUSTER,
+    0x1C53BB6B,  # Cues
+    0x1941A469,  # Attachments
+    0x1043A770,  # Chapters
+    0x1254C367,  # Tags
+}
+
+
+def get_index_key(session_id) -> str:
+    return f"{session_id}.index.json"
+
+
+def get_sprite_key(session_id) -> str:
+    return f"{session_id}.sprite.jpg"
+
+
+# ---------------------------------------------------------
+# EBML primitives
+# ---------------------------------------------------------
+
+def _read_vint(buf, pos: int, keep_marker: bool = False):
+    """
+    Reads an EBML variable-length integer. Returns (value, length, is_unknown).
+    IDs keep their length marker bit, sizes have it stripped.
+    """
+    first = buf[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError(f"Invalid EBML vint at byte {pos}")
+
+    value = first if keep_marker else first & (mask - 1)
+    for i in range(1, length):
+        value = (value << 8) | buf[pos + i]
+
+    is_unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, is_unknown
+
+
+def _read_element_header(buf, pos: int):
+    """
+    Returns (element_id, data_start, data_end). data_end is None for
+    unknown-size elements.
+    """
+    element_id, id_len, _ = _read_vint(buf, pos, keep_marker=True)
+    size, size_len, is_unknown = _read_vint(buf, pos + id_len)
+    data_start = pos + id_len + size_len
+    data_end = None if is_unknown else data_start + size
+    return element_id, data_start, data_end
+
+
+def _read_uint(buf, start: int, end: int) -> int:
+    return int.from_bytes(bytes(buf[start:end]), "big")
+
+
+def _read_float(buf, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack(">f", bytes(buf[start:end]))[0]
+    if end - start == 8:
+        return struct.unpack(">d", bytes(buf[start:end]))[0]
+    return 0.0
+
+
+def _children(buf, start: int, end: int):
+    """Yields (element_id, element_start, data_start, data_end) for each child."""
+    pos = start
+    while pos < end:
+        element_id, data_start, data_end = _read_element_header(buf, pos)
+        if data_end is None:
+            data_end = end
+        yield element_id, pos, data_start, min(data_end, end)
+        pos = data_end
+
+
+# ---------------------------------------------------------
+# WebM scanner
+# ---------------------------------------------------------
+
+def _parse_tracks(buf, start: int, end: int) -> Dict[str, Any]:
+    """Finds the first video track and its frame dimensions."""
+    for element_id, _, data_start, data_end in _children(buf, start, end):
+        if element_id != TRACK_ENTRY:
+            continue
+        track = {"number": None, "type": None, "width": None, "height": None}
+        for child_id, _, c_start, c_end in _children(buf, data_start, data_end):
+            if child_id == TRACK_NUMBER:
+                track["number"] = _read_uint(buf, c_start, c_end)
+            elif child_id == TRACK_TYPE:
+                track["type"] = _read_uint(buf, c_start, c_end)
+            elif child_id == VIDEO:
+                for v_id, _, v_start, v_end in _children(buf, c_start, c_end):
+                    if v_id == PIXEL_WIDTH:
+                        track["width"] = _read_uint(buf, v_start, v_end)
+                    elif v_id == PIXEL_HEIGHT:
+                        track["height"] = _read_uint(buf, v_start, v_end)
+        if track["type"] == 1:
+            return track
+    return {}
+
+
+def _parse_block_header(buf, start: int):
+    """Returns (track_number, relative_timecode, flags) for a (Simple)Block."""
+    track_number, length, _ = _read_vint(buf, start)
+    rel_timecode = struct.unpack(">h", bytes(buf[start + length:start + length + 2]))[0]
+    flags = buf[start + length + 2]
+    return track_number, rel_timecode, flags
+
+
+def _scan_cluster(buf, cluster_start: int, start: int, end: Optional[int], state: Dict[str, Any]) -> int:
+    """
+    Walks one Cluster, recording every keyframe on the video track.
+    Returns the byte position where the cluster ends.
+    """
+    cluster_timecode = 0
+    pos = start
+    limit = end if end is not None else len(buf)
+
+    while pos < limit:
+        element_id, data_start, data_end = _read_element_header(buf, pos)
+        if end is None and element_id in SEGMENT_CHILDREN:
+            # Unknown-size cluster: the next top-level element closes it
+            return pos
+        if data_end is None:
+            data_end = limit
+
+        block = None
+        if element_id == CLUSTER_TIMECODE:
+            cluster_timecode = _read_uint(buf, data_start, data_end)
+        elif element_id == SIMPLE_BLOCK:
+            track_number, rel_timecode, flags = _parse_block_header(buf, data_start)
+            block = (track_number, rel_timecode, bool(flags & 0x80))
+        elif element_id == BLOCK_GROUP:
+            is_keyframe = True
+            for child_id, _, c_start, _ in _children(buf, data_start, data_end):
+                if child_id == BLOCK:
+                    track_number, rel_timecode, _ = _parse_block_header(buf, c_start)
+                    block = (track_number, rel_timecode, True)
+                elif child_id == REFERENCE_BLOCK:
+                    is_keyframe = False
+            if block:
+                block = (block[0], block[1], is_keyframe)
+
+        if block:
+            track_number, rel_timecode, is_keyframe = block
+            seconds = (cluster_timecode + rel_timecode) * state["timecode_scale"] / 1e9
+            state["last_time"] = max(state["last_time"], seconds)
+            if is_keyframe and track_number == state["video_track"]:
+                state["keyframes"].append({
+                    "time": round(seconds, 3),
+                    "offset": cluster_start,
+                    "block_offset": pos,
+                })
+
+        pos = data_end
+
+    return limit
+
+
+def scan_webm(path: str) -> Dict[str, Any]:
+    """
+    Single pass over a WebM file. Collects the byte offset of every video
+    keyframe (and of the Cluster holding it, which is where a ranged read
+    has to start), the init segment size, duration and frame dimensions.
+    MediaRecorder output has no Cues and unknown-size Clusters, so the
+    clusters are walked directly instead of trusting the Cues element.
+    """
+    with open(path, "rb") as f:
+        buf = memoryview(f.read())
+
+    state = {
+        "timecode_scale": 1_000_000,
+        "video_track": None,
+        "last_time": 0.0,
+        "keyframes": [],
+    }
+    duration = None
+    width = None
+    height = None
+    first_cluster = None
+
+    pos = 0
+    try:
+        while pos < len(buf):
+            element_id, data_start, data_end = _read_element_header(buf, pos)
+            if element_id != SEGMENT:
+                if data_end is None:
+                    break
+                pos = data_end
+                continue
+
+            segment_end = data_end if data_end is not None else len(buf)
+            seg_pos = data_start
+            while seg_pos < segment_end:
+                child_id, c_start, c_end = _read_element_header(buf, seg_pos)
+
+                if child_id == CLUSTER:
+                    if first_cluster is None:
+                        first_cluster = seg_pos
+                    seg_pos = _scan_cluster(buf, seg_pos, c_start, c_end, state)
+                    continue
+
+                if c_end is None:
+                    c_end = segment_end
+                if child_id == INFO:
+                    for info_id, _, i_start, i_end in _children(buf, c_start, c_end):
+                        if info_id == TIMECODE_SCALE:
+                            state["timecode_scale"] = _read_uint(buf, i_start, i_end)
+                        elif info_id == DURATION:
+                            duration = _read_float(buf, i_start, i_end)
+                elif child_id == TRACKS:
+                    track = _parse_tracks(buf, c_start, c_end)
+                    state["video_track"] = track.get("number")
+                    width = track.get("width")
+                    height = track.get("height")
+                seg_pos = c_end
+            break
+    except (ValueError, IndexError, struct.error) as e:
+        # Recordings cut off mid-upload end in a partial element; keep what was indexed
+        logger.warning(f"⚠️ WebM scan stopped early: {e}")
+
+    if duration:
+        # Info Duration is expressed in TimecodeScale units
+        duration = duration * state["timecode_scale"] / 1e9
+    else:
+        duration = state["last_time"]
+
+    return {
+        "duration": round(duration, 3),
+        "width": width,
+        "height": height,
+        "init_size": first_cluster,
+        "file_size": len(buf),
+        "keyframes": state["keyframes"],
+    }
+
+
+# ---------------------------------------------------------
+# Timeline join & thumbnails
+# ---------------------------------------------------------
+
+def join_timeline(timeline: List[Dict[str, Any]], keyframes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Attaches the keyframe each timeline point has to be decoded from, i.e. the
+    last keyframe at or before its timestamp (the first one if none precedes it).
+    """
+    if not keyframes:
+        return []
+
+    times = [k["time"] for k in keyframes]
+    joined = []
+    for point in timeline:
+        i = max(bisect.bisect_right(times, point.get("timestamp", 0.0)) - 1, 0)
+        joined.append({
+            **point,
+            "keyframe_time": keyframes[i]["time"],
+            "offset": keyframes[i]["offset"],
+        })
+    return joined
+
+
+def build_sprite(video_path: str, sprite_path: str, scan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Renders the thumbnail sprite sheet with ffmpeg. Returns the layout the
+    frontend needs to slice it, or None if ffmpeg is unavailable or fails.
+    """
+    width, height = scan.get("width"), scan.get("height")
+    if width and height:
+        thumb_height = max(2, round(THUMBNAIL_WIDTH * height / width / 2) * 2)
+    else:
+        thumb_height = 90
+
+    count = max(1, math.ceil(scan["duration"] / THUMBNAIL_INTERVAL))
+    columns = min(SPRITE_COLUMNS, count)
+    rows = math.ceil(count / columns)
+
+    cmd = [
+        "ffmpeg", "-v", "error", "-y", "-i", video_path,
+        "-vf", f"fps=1/{THUMBNAIL_INTERVAL},scale={THUMBNAIL_WIDTH}:{thumb_height},tile={columns}x{rows}",
+        "-frames:v", "1", "-q:v", "5", sprite_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
+    except FileNotFoundError:
+        logger.warning("⚠️ ffmpeg not installed, skipping thumbnail sprite")
+        return None
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"⚠️ Thumbnail sprite generation failed: {e}")
+        return None
+
+    return {
+        "interval": THUMBNAIL_INTERVAL,
+        "columns": columns,
+        "rows": rows,
+        "count": count,
+        "width": THUMBNAIL_WIDTH,
+        "height": thumb_height,
+    }
+
+
+def build_replay_index(session_id, video_path: str, timeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Post-upload stage: scans the local webm once, renders the sprite sheet and
+    stores both next to the video in S3 so the replay page can scrub with
+    small ranged reads instead of streaming the whole file.
+    """
+    scan = scan_webm(video_path)
+    logger.info(f"🎞️ [SESSION {session_id}] {len(scan['keyframes'])} keyframes over {scan['duration']}s")
+
+    sprite_path = f"/tmp/{session_id}.sprite.jpg"
+    try:
+        sprite = build_sprite(video_path, sprite_path, scan)
+        if sprite:
+            s3_internal.upload_file(
+                sprite_path,
+                VIDEO_BUCKET,
+                get_sprite_key(session_id),
+                ExtraArgs={'ContentType': 'image/jpeg'}
+            )
+            sprite["key"] = get_sprite_key(session_id)
+    finally:
+        if os.path.exists(sprite_path):
+            os.remove(sprite_path)
+
+    index = {
+        **scan,
+        "sprite": sprite,
+        "timeline": join_timeline(timeline, scan["keyframes"]),
+    }
+    s3_internal.put_object(
+        Bucket=VIDEO_BUCKET,
+        Key=get_index_key(session_id),
+        Body=json.dumps(index).encode("utf-8"),
+        ContentType="application/json"
+    )
+    return index
@@ -24,6 +24,33 @@ export interface AnalysisData {
   };
 }
 
+export interface ReplayIndex {
+  duration: number;
+  init_size: number | null;
+  file_size: number;
+  keyframes: Array<{
+    time: number;
+    offset: number;
+    block_offset: number;
+  }>;
+  sprite: {
+    key: string;
+    interval: number;
+    columns: number;
+    rows: number;
+    count: number;
+    width: number;
+    height: number;
+  } | null;
+  timeline: Array<{
+    timestamp: number;
+    valence: number;
+    arousal: number;
+    keyframe_time: number;
+    offset: number;
+  }>;
+}
+
 export const api = {
   // 1. Get Presigned URL
   startSession: async (question: string): Promise<Session> => {
@@ -53,6 +80,17 @@ export const api = {
     return `${API_BASE}/sessions/${sessionId}/video`;
   },
 
+  // NEW: Keyframe offsets + timeline pre-joined to keyframes (for scrubbing)
+  getReplayIndex: async (sessionId: string): Promise<ReplayIndex> => {
+    const res = await axios.get(`${API_BASE}/sessions/${sessionId}/replay-index`);
+    return res.data;
+  },
+
+  // NEW: Thumbnail sprite sheet for hover previews
+  getThumbnailSpriteUrl: (sessionId: string) => {
+    return `${API_BASE}/sessions/${sessionId}/thumbnails`;
+  },
+
   // 3. Trigger Mock Analysis
   triggerAnalysis: async (sessionId: number) => {
     await axios.post(`${API_BASE}/analysis/${sessionId}/trigger`);